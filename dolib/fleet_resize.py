@@ -0,0 +1,400 @@
+import json
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+DO_API_URL = "https://api.digitalocean.com/v2"
+
+# Read-only load balancer attributes left out on update. Everything else is sent
+# back unchanged as the API replaces the complete definition.
+LB_READ_ONLY_ATTRIBUTES = (
+    "id",
+    "ip",
+    "ipv6",
+    "status",
+    "created_at",
+    "region",
+    "size",
+    "droplet_ids",
+    "tag",
+)
+
+# HTTP status codes for which a request is retried
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+def _api_request(api_url, token, method, path, body=None):
+    """Send a request to the DigitalOcean API and return the decoded JSON response.
+    Raises an exception if the request fails."""
+    url = path if path.startswith("http") else api_url.rstrip("/") + path
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(
+        url,
+        data=data,
+        method=method,
+        headers={
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+        },
+    )
+    with urllib.request.urlopen(request, timeout=60) as response:
+        content = response.read()
+    return json.loads(content) if content else {}
+
+
+def _retry_delay(error, delay):
+    """Return the seconds to wait before retrying, honouring Retry-After on rate limiting"""
+    retry_after = error.headers.get("Retry-After") if error.headers else None
+    if error.code == 429 and retry_after and retry_after.isdigit():
+        return int(retry_after)
+    return delay
+
+
+def _api_request_with_retry(api_url, token, method, path, body=None, attempts=4, initial_delay=2):
+    """Send a request to the DigitalOcean API, retrying on rate limiting, server errors and
+    connection failures. The Retry-After header is honoured on rate limiting, otherwise the
+    delay doubles after every attempt. Raises the last exception if all attempts fail.
+    Only meant for idempotent requests, droplet actions are started with _start_droplet_action."""
+    delay = initial_delay
+    for attempt in range(1, attempts + 1):
+        try:
+            return _api_request(api_url, token, method, path, body)
+        except urllib.error.HTTPError as e:
+            if e.code not in RETRY_STATUS_CODES or attempt == attempts:
+                raise
+            wait = _retry_delay(e, delay)
+            logger.warning(f"{method} {path} failed with {e.code}, retrying in {wait}s")
+        except urllib.error.URLError as e:
+            if attempt == attempts:
+                raise
+            wait = delay
+            logger.warning(f"{method} {path} failed - {e.reason}, retrying in {wait}s")
+        time.sleep(wait)
+        delay *= 2
+
+
+def _label(resource):
+    """Return the name and id of a droplet or load balancer for logging"""
+    return f"{resource['name']} ({resource['id']})"
+
+
+def _list_all(api_url, token, path, key):
+    """Return all the items of a paginated listing"""
+    items = []
+    separator = "&" if "?" in path else "?"
+    next_page = f"{path}{separator}per_page=200"
+    while next_page:
+        response = _api_request_with_retry(api_url, token, "GET", next_page)
+        items.extend(response.get(key, []))
+        next_page = response.get("links", {}).get("pages", {}).get("next")
+    return items
+
+
+def wait_for_status(fetch_status, done_status, initial_delay=2, max_delay=30, timeout=1800):
+    """Poll until the expected status is reached. The delay between polls starts small and
+    grows by half after every poll, so quick operations are noticed quickly and slow ones
+    are not polled more than needed.
+
+    Parameters:
+        fetch_status: callable, returns the current status
+        done_status: str, status which indicates completion
+        initial_delay: float, seconds to wait before the first poll
+        max_delay: float, upper limit in seconds of the delay between polls
+        timeout: float, seconds after which waiting is abandoned
+
+    Returns:
+        True if the expected status is reached
+        False if the operation errored or timed out
+    """
+    delay = initial_delay
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(delay)
+        try:
+            status = fetch_status()
+        except Exception as e:
+            logger.warning(f"Exception while polling status - {e}")
+            status = None
+        if status == done_status:
+            return True
+        if status == "errored":
+            return False
+        delay = min(delay * 1.5, max_delay)
+
+    logger.error(f"Timed out waiting for status {done_status}")
+    return False
+
+
+def _find_started_action(api_url, token, droplet_id, action_type, not_before):
+    """Return the action of the given type started on the droplet since not_before, if any"""
+    actions = _api_request_with_retry(
+        api_url, token, "GET", f"/droplets/{droplet_id}/actions?per_page=20"
+    ).get("actions", [])
+    for action in actions:
+        if action.get("type") != action_type:
+            continue
+        if action.get("status") == "in-progress":
+            return action
+        started_at = action.get("started_at")
+        if started_at and datetime.fromisoformat(started_at.replace("Z", "+00:00")) >= not_before:
+            return action
+    return None
+
+
+def _start_droplet_action(api_url, token, droplet_id, action_type, params, attempts=4, initial_delay=2):
+    """Start an action on a droplet and return it. Starting an action is not idempotent, so
+    it is simply retried only on rate limiting. After a server or connection error the API
+    may still have accepted the request, the recent actions of the droplet are checked for
+    it before posting again. Raises the last exception if all attempts fail."""
+    # Allow for clock differences with the API when matching recently started actions
+    not_before = datetime.now(timezone.utc) - timedelta(minutes=1)
+    delay = initial_delay
+    for attempt in range(1, attempts + 1):
+        try:
+            return _api_request(
+                api_url,
+                token,
+                "POST",
+                f"/droplets/{droplet_id}/actions",
+                {"type": action_type, **params},
+            )["action"]
+        except urllib.error.HTTPError as e:
+            if e.code not in RETRY_STATUS_CODES or attempt == attempts:
+                raise
+            wait = _retry_delay(e, delay)
+            accepted_maybe = e.code != 429
+            logger.warning(f"Starting {action_type} on droplet {droplet_id} failed with {e.code}")
+        except urllib.error.URLError as e:
+            if attempt == attempts:
+                raise
+            wait = delay
+            accepted_maybe = True
+            logger.warning(f"Starting {action_type} on droplet {droplet_id} failed - {e.reason}")
+        time.sleep(wait)
+        delay *= 2
+
+        if accepted_maybe:
+            action = _find_started_action(api_url, token, droplet_id, action_type, not_before)
+            if action:
+                logger.info(f"{action_type} on droplet {droplet_id} was accepted, waiting on it")
+                return action
+        logger.info(f"Retrying {action_type} on droplet {droplet_id}")
+
+
+def run_droplet_action(api_url, token, droplet_id, action_type, **params):
+    """Start an action on a droplet and wait for it to complete
+
+    Parameters:
+        api_url: str, base URL of the DigitalOcean API
+        token: str, API token
+        droplet_id: int, id of the droplet
+        action_type: str, action to be performed like power_off, resize, power_on
+        params: additional attributes of the action, like size for resize
+
+    Returns:
+        True if the action completed
+        False if the action could not be started or did not complete
+    """
+    try:
+        action = _start_droplet_action(api_url, token, droplet_id, action_type, params)
+        logger.info(f"Droplet {droplet_id} {action_type} action id is {action['id']}")
+    except Exception as e:
+        logger.error(f"Exception while starting {action_type} on droplet {droplet_id} - {e}")
+        return False
+
+    if action.get("status") == "completed":
+        return True
+
+    return wait_for_status(
+        lambda: _api_request(api_url, token, "GET", f"/actions/{action['id']}")["action"]["status"],
+        "completed",
+    )
+
+
+def resize_droplet(api_url, token, droplet, new_size):
+    """Power off, resize and power on a droplet. The droplet is expected as returned by the
+    droplet listing so that its current state does not have to be fetched again.
+
+    Parameters:
+        api_url: str, base URL of the DigitalOcean API
+        token: str, API token
+        droplet: dict, droplet as returned by the API
+        new_size: str, size slug like s-1vcpu-1gb
+
+    Returns:
+        True if the droplet is resized and active again, or already of the new size
+        False otherwise
+    """
+    name = _label(droplet)
+    if droplet.get("size_slug") == new_size:
+        logger.info(f"Droplet {name} is already of size {new_size}, skipping")
+        return True
+
+    if droplet.get("status") == "active":
+        logger.info(f"Powering off droplet {name}")
+        if not run_droplet_action(api_url, token, droplet["id"], "power_off"):
+            logger.error(f"Could not power off droplet {name}")
+            return False
+    elif droplet.get("status") != "off":
+        logger.error(f"Unknown status {droplet.get('status')} of droplet {name}. Doing nothing.")
+        return False
+
+    logger.info(f"Resizing droplet {name} to {new_size}")
+    resized = run_droplet_action(
+        api_url, token, droplet["id"], "resize", size=new_size, disk=False
+    )
+    if not resized:
+        logger.error(f"Could not resize droplet {name}, powering it back on")
+
+    logger.info(f"Powering on droplet {name}")
+    if not run_droplet_action(api_url, token, droplet["id"], "power_on"):
+        logger.error(f"Could not power on droplet {name}, please manually check")
+        return False
+
+    return resized
+
+
+def _collect_results(futures, kind):
+    """Gather the outcome of every resize, an unexpected exception in one of them is
+    recorded as a failure of that resource only"""
+    results = {}
+    for resource_id, (name, future) in futures.items():
+        try:
+            resized = future.result()
+        except Exception as e:
+            logger.error(f"Unexpected error while resizing {kind} {name} ({resource_id}) - {e}")
+            resized = False
+        results[resource_id] = {"name": name, "resized": resized}
+    return results
+
+
+def resize_droplets_by_tag(api_url, token, tag, new_size, max_workers=10):
+    """Resize all droplets with the specified tag concurrently
+
+    Parameters:
+        api_url: str, base URL of the DigitalOcean API
+        token: str, API token
+        tag: str, tag of the droplets to be resized
+        new_size: str, size slug like s-1vcpu-1gb
+        max_workers: int, number of droplets resized at the same time
+
+    Returns:
+        Dictionary of droplet id to {"name": str, "resized": bool} indicating the outcome of the resize
+        False if the droplets could not be listed
+    """
+    try:
+        droplets = _list_all(api_url, token, f"/droplets?tag_name={urllib.parse.quote(tag)}", "droplets")
+    except Exception as e:
+        logger.error(f"Exception while listing droplets with tag {tag} - {e}")
+        return False
+
+    logger.info(f"{len(droplets)} droplets found with tag {tag}")
+    if not droplets:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            droplet["id"]: (
+                droplet["name"],
+                executor.submit(resize_droplet, api_url, token, droplet, new_size),
+            )
+            for droplet in droplets
+        }
+    return _collect_results(futures, "droplet")
+
+
+def resize_load_balancer(api_url, token, lb, size_unit):
+    """Resize a load balancer keeping all its other settings. The load balancer is expected
+    as returned by the load balancer listing.
+
+    Parameters:
+        api_url: str, base URL of the DigitalOcean API
+        token: str, API token
+        lb: dict, load balancer as returned by the API
+        size_unit: int, new size of the load balancer in units
+
+    Returns:
+        True if the load balancer is resized and active again, or already of the new size
+        False otherwise
+    """
+    name = _label(lb)
+    if lb.get("size_unit") == size_unit:
+        logger.info(f"Load balancer {name} is already of {size_unit} units, skipping")
+        return True
+
+    body = {key: value for key, value in lb.items() if key not in LB_READ_ONLY_ATTRIBUTES}
+    if lb.get("region"):
+        body["region"] = lb["region"]["slug"]
+    body["size_unit"] = size_unit
+    # Droplets are either assigned through a tag or listed explicitly
+    if lb.get("tag"):
+        body["tag"] = lb["tag"]
+    else:
+        body["droplet_ids"] = lb.get("droplet_ids", [])
+
+    logger.info(f"Resizing load balancer {name} to {size_unit} units")
+    try:
+        _api_request_with_retry(api_url, token, "PUT", f"/load_balancers/{lb['id']}", body)
+    except Exception as e:
+        logger.error(f"Exception while resizing load balancer {name} - {e}")
+        return False
+
+    def fetch_status():
+        current = _api_request(api_url, token, "GET", f"/load_balancers/{lb['id']}")["load_balancer"]
+        # The load balancer may still report active with the old size right after the update
+        if current.get("status") == "active" and current.get("size_unit") != size_unit:
+            return "resizing"
+        return current.get("status")
+
+    return wait_for_status(fetch_status, "active")
+
+
+def resize_load_balancers(api_url, token, names, size_unit, max_workers=10):
+    """Resize the specified load balancers concurrently
+
+    Parameters:
+        api_url: str, base URL of the DigitalOcean API
+        token: str, API token
+        names: list, names of the load balancers to be resized
+        size_unit: int, new size of the load balancers in units
+        max_workers: int, number of load balancers resized at the same time
+
+    Returns:
+        Dictionary of load balancer id to {"name": str, "resized": bool} indicating the outcome of the resize
+        False if the load balancers could not be listed, or a name is not found or is ambiguous.
+        Nothing is resized in that case.
+    """
+    try:
+        load_balancers = _list_all(api_url, token, "/load_balancers", "load_balancers")
+    except Exception as e:
+        logger.error(f"Exception while listing load balancers - {e}")
+        return False
+
+    selected = {}
+    for name in names:
+        matches = [lb for lb in load_balancers if lb["name"] == name]
+        if not matches:
+            logger.error(f"Could not find load balancer {name}")
+            return False
+        if len(matches) > 1:
+            logger.error(
+                f"Load balancer name {name} is ambiguous, matches {', '.join(_label(lb) for lb in matches)}"
+            )
+            return False
+        selected[matches[0]["id"]] = matches[0]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            lb_id: (
+                lb["name"],
+                executor.submit(resize_load_balancer, api_url, token, lb, size_unit),
+            )
+            for lb_id, lb in selected.items()
+        }
+    return _collect_results(futures, "load balancer")
@@ -0,0 +1,95 @@
+import json
+import logging
+import os
+import tarfile
+
+logger = logging.getLogger(__name__)
+
+# Suffix of the sidecar index uploaded next to every packed archive
+PACK_INDEX_SUFFIX = ".index.json"
+
+
+def group_files_for_packing(file_paths, target_size):
+    """Split the files into groups whose combined size stays within the target size.
+    A file larger than the target size ends up alone in its group, a file which can not be
+    read is left out.
+
+    Parameters:
+        file_paths: list, full paths of the files to be packed
+        target_size: int, desired size in bytes of each archive
+
+    Returns:
+        List of groups, each group being a list of file paths
+    """
+    groups = []
+    current_group = []
+    current_size = 0
+    for path in file_paths:
+        try:
+            size = os.path.getsize(path)
+        except Exception as e:
+            logger.error(f"Exception while reading file {path}, not packing it - {e}")
+            continue
+        if current_group and current_size + size > target_size:
+            groups.append(current_group)
+            current_group = []
+            current_size = 0
+        current_group.append(path)
+        current_size += size
+
+    if current_group:
+        groups.append(current_group)
+
+    return groups
+
+
+def write_pack(file_paths, archive_path):
+    """Write the files into an uncompressed tar archive and build its index. Each member
+    is stored under its base name and the index maps the member name to the offset and
+    length of its data within the archive so that it can be read with a ranged GET.
+
+    Parameters:
+        file_paths: list, full paths of the files to be packed
+        archive_path: str, full path of the archive to be created
+
+    Returns:
+        Dictionary of member name to {"offset": int, "length": int}
+        None if the archive could not be written
+    """
+    try:
+        with tarfile.open(archive_path, "w") as tar:
+            for path in file_paths:
+                tar.add(path, arcname=os.path.basename(path), recursive=False)
+
+        # Data offsets are only known once the headers have been written, read
+        # them back from the archive
+        with tarfile.open(archive_path, "r") as tar:
+            return {
+                member.name: {"offset": member.offset_data, "length": member.size}
+                for member in tar.getmembers()
+                if member.isfile()
+            }
+    except Exception as e:
+        logger.error(f"Exception while writing archive {archive_path} - {e}")
+        return None
+
+
+def write_pack_index(index, index_path):
+    """Write the archive index as JSON to the specified file
+
+    Parameters:
+        index: dict, member name to offset and length as returned by write_pack
+        index_path: str, full path of the index file to be created
+
+    Returns:
+        False if the index could not be written
+        True if the index is written
+    """
+    try:
+        with open(index_path, "w") as f:
+            json.dump(index, f, sort_keys=True)
+    except Exception as e:
+        logger.error(f"Exception while writing index {index_path} - {e}")
+        return False
+    else:
+        return True
@@ -1,11 +1,26 @@
+import json
 import logging
+import math
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 import boto3.session
 import botocore.exceptions
 from botocore.client import Config
 
+from dolib.packing import PACK_INDEX_SUFFIX
+
 logger = logging.getLogger(__name__)
 
+# Size of each part read from disk and shared between all destinations during
+# a fan-out upload. Matches the default multipart chunk size used by boto3.
+MULTIPART_CHUNK_SIZE = 8 * 1024 * 1024
+# Maximum number of parts allowed in a multipart upload
+MULTIPART_MAX_PARTS = 10000
+# Size of the connection pool of every S3 client
+MAX_POOL_CONNECTIONS = 10
+
 def new_s3_client(region, endpoint_url, access_key, secret_key):
     """Initialize an S3 client with a private session so that multithreading
     doesn't cause issues with the client's internal state. Includes retry logic
@@ -25,7 +40,7 @@ def new_s3_client(region, endpoint_url, access_key, secret_key):
     try:
         session = boto3.session.Session()
         config = Config(
-            max_pool_connections=10,
+            max_pool_connections=MAX_POOL_CONNECTIONS,
             retries={'max_attempts': 3, 'mode': 'adaptive'}
         )
         return session.client(
@@ -109,6 +124,186 @@ def upload_to_object_store(
         return True
 
 
+def upload_to_multiple_object_stores(
+    destinations,
+    full_path_to_filename,
+    object_name,
+    content_type="binary/octet-stream",
+    chunk_size=MULTIPART_CHUNK_SIZE,
+):
+    """Uploads the specified file to several object stores, reading it from disk only once.
+    The file is read in parts and every part is shared by all the destinations. A bounded
+    window of parts is kept in flight to every destination and a part is released once all
+    the destinations have acknowledged it. Files smaller than a single part are sent with one
+    PUT per destination. With a single destination the managed transfer of boto3 is used
+    instead.
+
+    Parameters:
+        destinations: list, (client, bucket) tuples, one per target location
+        full_path_to_filename: str, full path of the file to be uploaded
+        object_name: str, the name of the file at the target locations
+        content_type: str, the content type of the file. Default value of binary/octet-stream is used if not specified
+        chunk_size: int, size in bytes of each part read from disk
+
+    Returns:
+        List of booleans in the same order as destinations, True where the upload succeeded
+    """
+    results = [False] * len(destinations)
+    if not destinations:
+        return results
+
+    if len(destinations) == 1:
+        client, bucket = destinations[0]
+        results[0] = upload_to_object_store(
+            client, bucket, full_path_to_filename, object_name, content_type
+        )
+        return results
+
+    try:
+        # Grow the parts so that large files stay within the part count limit
+        file_size = os.path.getsize(full_path_to_filename)
+        chunk_size = max(chunk_size, math.ceil(file_size / MULTIPART_MAX_PARTS))
+    except Exception as e:
+        logger.error(f"Exception while reading file {full_path_to_filename} - {e}")
+        return results
+
+    # Parts in flight per destination, keeping the total within the connection pool
+    window = max(1, MAX_POOL_CONNECTIONS // len(destinations))
+    extra_args = {"ACL": "private", "ContentType": content_type}
+    upload_ids = [None] * len(destinations)
+    parts = [[] for _ in destinations]
+    active = []
+    failed = []
+
+    def collect(part_number, futures):
+        for index, future in futures.items():
+            try:
+                etag = future.result()["ETag"]
+                parts[index].append({"PartNumber": part_number, "ETag": etag})
+            except Exception as e:
+                logger.error(
+                    f"Exception while uploading part {part_number} to {destinations[index][1]} - {e}"
+                )
+                if index in active:
+                    active.remove(index)
+                    failed.append(index)
+
+    def abort(index):
+        client, bucket = destinations[index]
+        try:
+            client.abort_multipart_upload(
+                Bucket=bucket, Key=object_name, UploadId=upload_ids[index]
+            )
+        except Exception as e:
+            logger.error(f"Exception while aborting upload to {bucket} - {e}")
+
+    with ThreadPoolExecutor(max_workers=window * len(destinations)) as executor:
+        in_flight = deque()
+        try:
+            with open(full_path_to_filename, "rb") as f:
+                body = f.read(chunk_size)
+                next_body = f.read(chunk_size)
+
+                if not next_body:
+                    # Single part, a plain PUT to each destination is enough
+                    futures = [
+                        executor.submit(
+                            client.put_object,
+                            Bucket=bucket,
+                            Key=object_name,
+                            Body=body,
+                            **extra_args,
+                        )
+                        for client, bucket in destinations
+                    ]
+                    for index, future in enumerate(futures):
+                        try:
+                            future.result()
+                            results[index] = True
+                        except Exception as e:
+                            logger.error(
+                                f"Exception while uploading file to {destinations[index][1]} - {e}"
+                            )
+                    return results
+
+                futures = [
+                    executor.submit(
+                        client.create_multipart_upload,
+                        Bucket=bucket,
+                        Key=object_name,
+                        **extra_args,
+                    )
+                    for client, bucket in destinations
+                ]
+                for index, future in enumerate(futures):
+                    try:
+                        upload_ids[index] = future.result()["UploadId"]
+                        active.append(index)
+                    except Exception as e:
+                        logger.error(
+                            f"Exception while starting upload to {destinations[index][1]} - {e}"
+                        )
+
+                part_number = 1
+                while body and active:
+                    in_flight.append((
+                        part_number,
+                        {
+                            index: executor.submit(
+                                destinations[index][0].upload_part,
+                                Bucket=destinations[index][1],
+                                Key=object_name,
+                                PartNumber=part_number,
+                                UploadId=upload_ids[index],
+                                Body=body,
+                            )
+                            for index in active
+                        },
+                    ))
+                    # Wait for the oldest part once the window is full, its buffer
+                    # is released when every destination has acknowledged it
+                    if len(in_flight) >= window:
+                        collect(*in_flight.popleft())
+                    body, next_body = next_body, f.read(chunk_size) if next_body else b""
+                    part_number += 1
+
+                while in_flight:
+                    collect(*in_flight.popleft())
+        except Exception as e:
+            logger.error(f"Exception while reading file {full_path_to_filename} - {e}")
+            while in_flight:
+                collect(*in_flight.popleft())
+            for index in active + failed:
+                abort(index)
+            return results
+
+        # Multipart uploads are aborted only after their parts in flight are done
+        for index in failed:
+            abort(index)
+
+        futures = {
+            index: executor.submit(
+                destinations[index][0].complete_multipart_upload,
+                Bucket=destinations[index][1],
+                Key=object_name,
+                UploadId=upload_ids[index],
+                MultipartUpload={"Parts": parts[index]},
+            )
+            for index in active
+        }
+        for index, future in futures.items():
+            try:
+                future.result()
+                results[index] = True
+            except Exception as e:
+                logger.error(
+                    f"Exception while completing upload to {destinations[index][1]} - {e}"
+                )
+                abort(index)
+
+    return results
+
+
 def list_all_objects_older_than_last_modified(
     client, bucket, prefix, last_modified_timestamp
 ):
@@ -203,6 +398,98 @@ def get_object_contents(client, bucket, key):
         logging.error(f"Unknown exception - {e}")
         return False
 
+def get_pack_index(client, bucket, archive_key):
+    """Read the sidecar index of a packed archive from the object store.
+
+    Parameters:
+        client: str, the boto3 client object
+        bucket: str, target bucket location
+        archive_key: str, archive filename with prefix
+
+    Returns:
+        Dictionary of member name to {"offset": int, "length": int} in case the index is read successfully.
+        False in case the index is not found or could not be read.
+    """
+    body = get_object_contents(client, bucket, archive_key + PACK_INDEX_SUFFIX)
+    if body is False:
+        return False
+    try:
+        return json.loads(body)
+    except Exception as e:
+        logger.error(f"Invalid index for {archive_key} - {e}")
+        return False
+
+def get_packed_member(client, bucket, archive_key, member_name, index=None):
+    """Read a single member of a packed archive with a ranged GET, without downloading the whole archive.
+
+    Parameters:
+        client: str, the boto3 client object
+        bucket: str, target bucket location
+        archive_key: str, archive filename with prefix
+        member_name: str, name of the file inside the archive
+        index: dict, index of the archive. It is read from the object store if not specified
+
+    Returns:
+        Contents of the member in case it is read successfully.
+        False in case the member is not found or could not be read.
+    """
+    if index is None:
+        index = get_pack_index(client, bucket, archive_key)
+        if index is False:
+            return False
+
+    entry = index.get(member_name)
+    if entry is None:
+        logger.error(f"{member_name} not found in {archive_key}")
+        return False
+    if entry["length"] == 0:
+        return b""
+
+    byte_range = f"bytes={entry['offset']}-{entry['offset'] + entry['length'] - 1}"
+    try:
+        return client.get_object(Bucket=bucket, Key=archive_key, Range=byte_range)[
+            "Body"
+        ].read()
+    except Exception as e:
+        logger.error(f"Unknown exception - {e}")
+        return False
+
+def find_packed_member(client, bucket, prefix, member_name):
+    """Search the indexes of the packed archives under a folder for the specified member.
+    The most recent archives are searched first.
+
+    Parameters:
+        client: str, the boto3 client object
+        bucket: str, target bucket location
+        prefix: str, folder name under which the archives are searched
+        member_name: str, name of the file inside the archive
+
+    Returns:
+        Tuple of archive key and archive index in case the member is found.
+        False in case the member is not found in any archive.
+    """
+    index_objects = []
+    try:
+        paginator = client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                if obj["Key"].endswith(PACK_INDEX_SUFFIX):
+                    index_objects.append(obj)
+    except Exception as e:
+        logger.error(f"Unknown Exception - {e}")
+        return False
+
+    logger.info(f"Searching {len(index_objects)} archive indexes for {member_name}")
+    for obj in sorted(index_objects, key=lambda obj: obj["LastModified"], reverse=True):
+        archive_key = obj["Key"][: -len(PACK_INDEX_SUFFIX)]
+        index = get_pack_index(client, bucket, archive_key)
+        if index is not False and member_name in index:
+            logger.info(f"{member_name} found in {archive_key}")
+            return archive_key, index
+
+    logger.error(f"{member_name} not found in any archive under {prefix}")
+    return False
+
 def delete_object(client, bucket, key):
     """Delete the specified file from the object store. The file should have the required prefix (folder path)
 
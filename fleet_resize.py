@@ -0,0 +1,119 @@
+import os
+import sys
+import logging
+import argparse
+from dotenv import load_dotenv
+
+from dolib.fleet_resize import (
+    DO_API_URL,
+    resize_droplets_by_tag,
+    resize_load_balancers,
+)
+
+
+def get_arguments():
+    """Resize all droplets with a tag, or a list of load balancers, concurrently"""
+    parser = argparse.ArgumentParser()
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument(
+        "-t",
+        "--tag",
+        type=str,
+        dest="tag",
+        help="Tag of the droplets to be resized",
+    )
+    target.add_argument(
+        "-l",
+        "--load-balancer",
+        type=str,
+        dest="load_balancers",
+        action="append",
+        help="Name of a load balancer to be resized. Can be specified multiple times.",
+    )
+    parser.add_argument(
+        "-s",
+        "--size",
+        type=str,
+        dest="size",
+        required=True,
+        help="New size slug for droplets, for example s-1vcpu-1gb, or new size in units for load balancers",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        dest="workers",
+        default=10,
+        help="Number of resources resized at the same time. Default is 10.",
+    )
+    options = parser.parse_args()
+    return options
+
+
+def main(tag, load_balancers, size, workers):
+    # take environment variables from .env
+    load_dotenv()
+
+    DO_API_TOKEN = os.getenv("DO_API_TOKEN")
+    # Allows pointing the script to a local mock of the API
+    DO_API_URL_OVERRIDE = os.getenv("DO_API_URL") or DO_API_URL
+
+    log_file = "do_fleet_resize.log"
+    loglevel = "INFO"
+    logging.basicConfig(
+        format="%(asctime)s - [%(name)s] - %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %I:%M:%S %p",
+        filename=log_file,
+        level=getattr(logging, loglevel.upper()),
+    )
+    logger = logging.getLogger(__name__)
+
+    # Also add console handler for immediate feedback
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(logging.INFO)
+    formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s", datefmt="%Y-%m-%d %I:%M:%S %p")
+    console_handler.setFormatter(formatter)
+    logging.getLogger().addHandler(console_handler)
+
+    logging.info("Started fleet resize run...")
+
+    if not DO_API_TOKEN:
+        logger.error("DO_API_TOKEN is not set")
+        return False
+
+    try:
+        if tag:
+            results = resize_droplets_by_tag(
+                DO_API_URL_OVERRIDE, DO_API_TOKEN, tag, size, max_workers=workers
+            )
+        else:
+            try:
+                size_unit = int(size)
+            except ValueError:
+                logger.error(f"Load balancer size must be a number of units, got {size}")
+                return False
+            results = resize_load_balancers(
+                DO_API_URL_OVERRIDE, DO_API_TOKEN, load_balancers, size_unit, max_workers=workers
+            )
+
+        if results is False:
+            return False
+
+        for resource_id, result in results.items():
+            logger.info(
+                f"{result['name']} ({resource_id}) - {'resized' if result['resized'] else 'FAILED'}"
+            )
+
+        return all(result["resized"] for result in results.values())
+
+    except Exception as e:
+        logger.error(f"Unexpected error during resize - {e}")
+        return False
+
+    finally:
+        logger.info("Completed the fleet resize run...")
+
+
+if __name__ == "__main__":
+    options = get_arguments()
+    sys.exit(0 if main(options.tag, options.load_balancers, options.size, options.workers) else 1)
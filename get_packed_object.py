@@ -0,0 +1,107 @@
+import os
+import logging
+import argparse
+from dotenv import load_dotenv
+
+from dolib.spaces_operations import (
+    find_packed_member,
+    get_packed_member,
+    new_s3_client,
+)
+
+
+def get_arguments():
+    """Fetch a single file from an archive packed by upload2spaces.py"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-b",
+        "--bucket",
+        type=str,
+        dest="bucket",
+        required=True,
+        help="Bucket where the archive is stored",
+    )
+    location = parser.add_mutually_exclusive_group(required=True)
+    location.add_argument(
+        "-a",
+        "--archive",
+        type=str,
+        dest="archive",
+        help="Archive key including the folder, for example Movies/pack-20260101T000000-1a2b3c4d5e6f-0001.tar",
+    )
+    location.add_argument(
+        "-f",
+        "--folder",
+        type=str,
+        dest="folder",
+        help="Folder whose archive indexes are searched for the file when the archive is not known",
+    )
+    parser.add_argument(
+        "-m",
+        "--member",
+        type=str,
+        dest="member",
+        required=True,
+        help="Name of the file inside the archive",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        dest="output",
+        default=None,
+        help="Local path where the file is written. Default is the member name in the current directory.",
+    )
+    options = parser.parse_args()
+    return options
+
+
+def main(bucket, archive, folder, member, output):
+    # take environment variables from .env
+    load_dotenv()
+
+    DO_ACCESS_ID = os.getenv("DO_ACCESS_ID")
+    DO_SECRET_KEY = os.getenv("DO_SECRET_KEY")
+    DO_REGION = os.getenv("DO_REGION")
+    DO_SPACES_URL = f"https://{DO_REGION}.digitaloceanspaces.com"
+
+    logging.basicConfig(
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %I:%M:%S %p",
+        level=logging.INFO,
+    )
+    logger = logging.getLogger(__name__)
+
+    client = new_s3_client(DO_REGION, DO_SPACES_URL, DO_ACCESS_ID, DO_SECRET_KEY)
+    if not client:
+        logger.error("Failed to create S3 client")
+        return False
+
+    index = None
+    if not archive:
+        if not folder.endswith("/"):
+            folder = folder + "/"
+        found = find_packed_member(client, bucket, folder, member)
+        if found is False:
+            return False
+        archive, index = found
+
+    contents = get_packed_member(client, bucket, archive, member, index)
+    if contents is False:
+        return False
+
+    output = output or member
+    try:
+        with open(output, "wb") as f:
+            f.write(contents)
+    except Exception as e:
+        logger.error(f"Exception while writing {output} - {e}")
+        return False
+
+    logger.info(f"Written {len(contents)} bytes to {output}")
+    return True
+
+
+if __name__ == "__main__":
+    options = get_arguments()
+    main(options.bucket, options.archive, options.folder, options.member, options.output)
@@ -0,0 +1,277 @@
+import copy
+import json
+import threading
+import unittest
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from dolib import fleet_resize
+
+
+class MockDigitalOceanAPI(BaseHTTPRequestHandler):
+    """Minimal stand-in for the parts of the DigitalOcean API used by fleet_resize.
+    State and recorded requests live on the server object.
+
+    state["failures"] maps (droplet id, action type) to a list of responses returned
+    instead of starting the action, each a dict with the HTTP code, optional headers,
+    optional payload and whether the action is started anyway ("accepted").
+    state["lb_polls_before_resize"] is the number of polls for which an updated load
+    balancer still reports active with its old size."""
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, code, payload=None, headers=None):
+        content = json.dumps(payload).encode() if payload is not None else b""
+        self.send_response(code)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _read_body(self):
+        return json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+
+    def do_GET(self):
+        state = self.server.state
+        self.server.requests.append(("GET", self.path, None))
+        path = self.path.split("?")[0]
+        if path == "/v2/droplets":
+            return self._send(200, {"droplets": state["droplets"], "links": {}})
+        if path == "/v2/load_balancers":
+            return self._send(200, {"load_balancers": state["load_balancers"], "links": {}})
+        if path.startswith("/v2/load_balancers/"):
+            lb_id = path.rsplit("/", 1)[1]
+            lb = next(lb for lb in state["load_balancers"] if lb["id"] == lb_id)
+            update = state["lb_updates"].get(lb_id)
+            if update is not None:
+                if state["lb_polls_before_resize"] > 0:
+                    state["lb_polls_before_resize"] -= 1
+                else:
+                    lb.update(update, status="active")
+            return self._send(200, {"load_balancer": lb})
+        if path.startswith("/v2/droplets/") and path.endswith("/actions"):
+            droplet_id = int(path.split("/")[3])
+            actions = [a for a in reversed(state["actions"]) if a["droplet_id"] == droplet_id]
+            return self._send(200, {"actions": actions, "links": {}})
+        if path.startswith("/v2/actions/"):
+            action = state["actions"][int(path.rsplit("/", 1)[1]) - 1]
+            action["status"] = "completed"
+            return self._send(200, {"action": action})
+        self._send(404, {"id": "not_found"})
+
+    def _start_action(self, droplet_id, action_type):
+        state = self.server.state
+        action = {
+            "id": len(state["actions"]) + 1,
+            "droplet_id": droplet_id,
+            "type": action_type,
+            "status": "in-progress",
+            "started_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        }
+        state["actions"].append(action)
+        return action
+
+    def do_POST(self):
+        state = self.server.state
+        body = self._read_body()
+        self.server.requests.append(("POST", self.path, body))
+        droplet_id = int(self.path.split("/")[3])
+        failures = state["failures"].get((droplet_id, body["type"]))
+        if failures:
+            failure = failures.pop(0)
+            if failure.get("accepted"):
+                self._start_action(droplet_id, body["type"])
+            return self._send(
+                failure["code"], failure.get("payload", {"id": "error"}), failure.get("headers")
+            )
+        self._send(201, {"action": self._start_action(droplet_id, body["type"])})
+
+    def do_PUT(self):
+        state = self.server.state
+        body = self._read_body()
+        self.server.requests.append(("PUT", self.path, body))
+        lb_id = self.path.rsplit("/", 1)[1]
+        state["lb_updates"][lb_id] = body
+        self._send(200, {"load_balancer": body})
+
+
+class FleetResizeTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), MockDigitalOceanAPI)
+        self.server.state = {
+            "droplets": [],
+            "load_balancers": [],
+            "failures": {},
+            "actions": [],
+            "lb_updates": {},
+            "lb_polls_before_resize": 0,
+        }
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.api_url = f"http://127.0.0.1:{self.server.server_port}/v2"
+
+        sleep_patcher = mock.patch.object(fleet_resize.time, "sleep")
+        self.sleep = sleep_patcher.start()
+        self.addCleanup(sleep_patcher.stop)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def requests(self, method):
+        return [request for request in self.server.requests if request[0] == method]
+
+    def test_load_balancer_resize_keeps_other_settings(self):
+        lb = {
+            "id": "lb-1",
+            "name": "web",
+            "ip": "10.0.0.1",
+            "ipv6": "",
+            "status": "active",
+            "created_at": "2026-01-01T00:00:00Z",
+            "size": "lb-small",
+            "size_unit": 2,
+            "type": "REGIONAL",
+            "network": "EXTERNAL",
+            "network_stack": "IPV4",
+            "algorithm": "round_robin",
+            "tls_cipher_policy": "STRONG",
+            "region": {"slug": "sgp1", "name": "Singapore 1"},
+            "tag": "web",
+            "droplet_ids": [1, 2],
+            "domains": [{"name": "example.com", "is_managed": True}],
+            "glb_settings": {"target_protocol": "http", "target_port": 80},
+            "target_load_balancer_ids": ["lb-9"],
+            "forwarding_rules": [{"entry_protocol": "https", "entry_port": 443}],
+            "health_check": {"protocol": "http", "port": 80, "path": "/"},
+            "sticky_sessions": {"type": "none"},
+            "redirect_http_to_https": True,
+            "vpc_uuid": "vpc-1",
+        }
+        self.server.state["load_balancers"] = [copy.deepcopy(lb)]
+
+        results = fleet_resize.resize_load_balancers(self.api_url, "token", ["web"], 4)
+
+        self.assertEqual(results, {"lb-1": {"name": "web", "resized": True}})
+        (_, path, body), = self.requests("PUT")
+        self.assertEqual(path, "/v2/load_balancers/lb-1")
+        expected = {
+            key: value
+            for key, value in lb.items()
+            if key not in ("id", "ip", "ipv6", "status", "created_at", "size", "droplet_ids")
+        }
+        expected.update({"region": "sgp1", "size_unit": 4})
+        self.assertEqual(body, expected)
+
+    def test_ambiguous_load_balancer_name_is_not_resized(self):
+        self.server.state["load_balancers"] = [
+            {"id": "lb-1", "name": "web", "size_unit": 2, "region": {"slug": "sgp1"}},
+            {"id": "lb-2", "name": "web", "size_unit": 2, "region": {"slug": "fra1"}},
+        ]
+
+        self.assertFalse(fleet_resize.resize_load_balancers(self.api_url, "token", ["web"], 4))
+        self.assertEqual(self.requests("PUT"), [])
+
+    def test_droplets_with_duplicate_names_are_reported_by_id(self):
+        self.server.state["droplets"] = [
+            {"id": 1, "name": "d1", "status": "active", "size_slug": "s-2vcpu-2gb"},
+            {"id": 2, "name": "d1", "status": "active", "size_slug": "s-2vcpu-2gb"},
+            {"id": 3, "name": "d2", "status": "off", "size_slug": "s-2vcpu-2gb"},
+        ]
+        self.server.state["failures"][(1, "resize")] = [{"code": 422}]
+
+        results = fleet_resize.resize_droplets_by_tag(self.api_url, "token", "web", "s-1vcpu-1gb")
+
+        self.assertEqual(
+            results,
+            {
+                1: {"name": "d1", "resized": False},
+                2: {"name": "d1", "resized": True},
+                3: {"name": "d2", "resized": True},
+            },
+        )
+        # The droplet whose resize failed is still powered back on
+        self.assertIn(
+            ("POST", "/v2/droplets/1/actions", {"type": "power_on"}), self.requests("POST")
+        )
+
+    def post_types(self):
+        return [body["type"] for _, _, body in self.requests("POST")]
+
+    def resize_one_droplet(self):
+        self.server.state["droplets"] = [
+            {"id": 1, "name": "d1", "status": "active", "size_slug": "s-2vcpu-2gb"},
+        ]
+        return fleet_resize.resize_droplets_by_tag(self.api_url, "token", "web", "s-1vcpu-1gb")
+
+    def test_action_start_is_retried_on_rate_limit(self):
+        self.server.state["failures"][(1, "resize")] = [
+            {"code": 429, "headers": {"Retry-After": "7"}},
+        ]
+
+        results = self.resize_one_droplet()
+
+        self.assertEqual(results, {1: {"name": "d1", "resized": True}})
+        self.assertIn(mock.call(7), self.sleep.call_args_list)
+        self.assertEqual(self.post_types(), ["power_off", "resize", "resize", "power_on"])
+
+    def test_accepted_action_is_not_posted_again_after_server_error(self):
+        self.server.state["failures"][(1, "resize")] = [{"code": 502, "accepted": True}]
+        self.server.state["failures"][(1, "power_on")] = [{"code": 504, "accepted": True}]
+
+        results = self.resize_one_droplet()
+
+        self.assertEqual(results, {1: {"name": "d1", "resized": True}})
+        self.assertEqual(self.post_types(), ["power_off", "resize", "power_on"])
+        self.assertIn(("GET", "/v2/actions/2", None), self.server.requests)
+        self.assertIn(("GET", "/v2/actions/3", None), self.server.requests)
+
+    def test_rejected_action_is_posted_again_after_server_error(self):
+        self.server.state["failures"][(1, "power_on")] = [{"code": 503}, {"code": 502}]
+
+        results = self.resize_one_droplet()
+
+        self.assertEqual(results, {1: {"name": "d1", "resized": True}})
+        self.assertEqual(
+            self.post_types(), ["power_off", "resize", "power_on", "power_on", "power_on"]
+        )
+        listings = [r for r in self.requests("GET") if r[1].startswith("/v2/droplets/1/actions")]
+        self.assertEqual(len(listings), 2)
+
+    def test_unexpected_error_fails_only_that_droplet(self):
+        self.server.state["droplets"] = [
+            {"id": 1, "name": "d1", "status": "off", "size_slug": "s-2vcpu-2gb"},
+            {"id": 2, "name": "d2", "status": "off", "size_slug": "s-2vcpu-2gb"},
+        ]
+
+        def resize_droplet(api_url, token, droplet, new_size):
+            if droplet["id"] == 1:
+                raise KeyError("id")
+            return True
+
+        with mock.patch.object(fleet_resize, "resize_droplet", side_effect=resize_droplet):
+            results = fleet_resize.resize_droplets_by_tag(self.api_url, "token", "web", "s-1vcpu-1gb")
+
+        self.assertEqual(
+            results,
+            {1: {"name": "d1", "resized": False}, 2: {"name": "d2", "resized": True}},
+        )
+
+    def test_load_balancer_is_polled_until_new_size_is_reported(self):
+        self.server.state["load_balancers"] = [
+            {"id": "lb-1", "name": "web", "status": "active", "size_unit": 2, "region": {"slug": "sgp1"}},
+        ]
+        self.server.state["lb_polls_before_resize"] = 2
+
+        results = fleet_resize.resize_load_balancers(self.api_url, "token", ["web"], 4)
+
+        self.assertEqual(results, {"lb-1": {"name": "web", "resized": True}})
+        polls = [r for r in self.requests("GET") if r[1] == "/v2/load_balancers/lb-1"]
+        self.assertEqual(len(polls), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+import datetime
+import json
+import os
+import tempfile
+import unittest
+
+from dolib.packing import PACK_INDEX_SUFFIX, group_files_for_packing, write_pack
+from dolib.spaces_operations import find_packed_member, get_packed_member
+from upload2spaces import upload_packed_files
+
+
+class FakeBody:
+    def __init__(self, data):
+        self.data = data
+
+    def read(self):
+        return self.data
+
+
+class FakePaginator:
+    def __init__(self, client):
+        self.client = client
+
+    def paginate(self, Bucket, Prefix):
+        yield {
+            "Contents": [
+                {"Key": key, "LastModified": modified}
+                for key, (_, modified) in self.client.objects.items()
+                if key.startswith(Prefix)
+            ]
+        }
+
+
+class FakeS3Client:
+    """Keeps uploaded objects in memory and serves ranged GETs from them"""
+
+    def __init__(self):
+        self.objects = {}
+        self.get_calls = []
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None):
+        with open(Filename, "rb") as f:
+            self.objects[Key] = (f.read(), datetime.datetime.now(datetime.timezone.utc))
+
+    def get_object(self, Bucket, Key, Range=None):
+        self.get_calls.append((Key, Range))
+        data = self.objects[Key][0]
+        if Range:
+            start, end = Range[len("bytes="):].split("-")
+            data = data[int(start):int(end) + 1]
+        return {"Body": FakeBody(data)}
+
+    def get_paginator(self, name):
+        return FakePaginator(self)
+
+
+class PackingTest(unittest.TestCase):
+    def setUp(self):
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        self.work_dir = work_dir.name
+        self.source_dir = os.path.join(self.work_dir, "source")
+        os.mkdir(self.source_dir)
+        # Names over 100 characters are stored with PAX headers, shifting the data
+        self.files = {
+            "short.flv": os.urandom(700),
+            "a" * 150 + ".flv": os.urandom(1500),
+            "empty.flv": b"",
+            "b" * 250 + ".flv": os.urandom(10),
+        }
+        for name, data in self.files.items():
+            with open(os.path.join(self.source_dir, name), "wb") as f:
+                f.write(data)
+
+    def paths(self):
+        return sorted(os.path.join(self.source_dir, name) for name in self.files)
+
+    def test_index_offsets_point_at_member_data(self):
+        archive_path = os.path.join(self.work_dir, "pack.tar")
+
+        index = write_pack(self.paths(), archive_path)
+
+        with open(archive_path, "rb") as f:
+            raw = f.read()
+        self.assertEqual(set(index), set(self.files))
+        for name, data in self.files.items():
+            entry = index[name]
+            self.assertEqual(entry["length"], len(data))
+            self.assertEqual(raw[entry["offset"]:entry["offset"] + entry["length"]], data)
+
+    def test_symlink_is_left_out_of_index(self):
+        link = os.path.join(self.source_dir, "link.flv")
+        os.symlink(os.path.join(self.source_dir, "short.flv"), link)
+
+        index = write_pack(self.paths() + [link], os.path.join(self.work_dir, "pack.tar"))
+
+        self.assertNotIn("link.flv", index)
+
+    def test_group_skips_missing_files(self):
+        missing = os.path.join(self.source_dir, "missing.flv")
+
+        groups = group_files_for_packing(self.paths() + [missing], 2000)
+
+        self.assertEqual(sorted(sum(groups, [])), self.paths())
+        for group in groups:
+            sizes = [os.path.getsize(path) for path in group]
+            self.assertTrue(len(group) == 1 or sum(sizes) <= 2000)
+
+    def test_packed_member_is_read_with_ranged_get(self):
+        client = FakeS3Client()
+        link = os.path.join(self.source_dir, "link.flv")
+        os.symlink(os.path.join(self.source_dir, "short.flv"), link)
+
+        packed = upload_packed_files(
+            [(client, "bucket")], self.paths() + [link], "Movies/", 64 * 1024
+        )
+
+        self.assertEqual(packed, len(self.files))
+        # Only the symlink is kept locally
+        self.assertEqual(os.listdir(self.source_dir), ["link.flv"])
+        archive_key, = [key for key in client.objects if key.endswith(".tar")]
+        index = json.loads(client.objects[archive_key + PACK_INDEX_SUFFIX][0])
+
+        for name, data in self.files.items():
+            client.get_calls = []
+            self.assertEqual(get_packed_member(client, "bucket", archive_key, name, index), data)
+            if data:
+                entry = index[name]
+                expected_range = f"bytes={entry['offset']}-{entry['offset'] + len(data) - 1}"
+                self.assertEqual(client.get_calls, [(archive_key, expected_range)])
+            else:
+                self.assertEqual(client.get_calls, [])
+
+    def test_packed_member_is_found_by_folder(self):
+        client = FakeS3Client()
+        upload_packed_files([(client, "bucket")], self.paths(), "Movies/", 1000)
+        name = "a" * 150 + ".flv"
+
+        archive_key, index = find_packed_member(client, "bucket", "Movies/", name)
+
+        self.assertIn(name, index)
+        self.assertEqual(
+            get_packed_member(client, "bucket", archive_key, name, index), self.files[name]
+        )
+        self.assertFalse(find_packed_member(client, "bucket", "Movies/", "missing.flv"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from dolib import spaces_operations
+from dolib.spaces_operations import upload_to_multiple_object_stores
+
+
+class FakeS3Client:
+    """Records the calls made by the multipart upload helpers and keeps the uploaded
+    objects in memory. A part number listed in fail_parts raises on upload."""
+
+    def __init__(self, fail_parts=(), part_delay=0):
+        self.fail_parts = set(fail_parts)
+        self.part_delay = part_delay
+        self.lock = threading.Lock()
+        self.calls = []
+        self.parts = {}
+        self.objects = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def _record(self, name, **kwargs):
+        with self.lock:
+            self.calls.append((name, kwargs))
+
+    def call_names(self):
+        return [name for name, _ in self.calls]
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self._record("put_object", Bucket=Bucket, Key=Key)
+        self.objects[Key] = Body
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None):
+        self._record("upload_file", Filename=Filename, Bucket=Bucket, Key=Key)
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self._record("create_multipart_upload", Bucket=Bucket, Key=Key)
+        return {"UploadId": "upload-1"}
+
+    def upload_part(self, Bucket, Key, PartNumber, UploadId, Body):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.part_delay)
+            self._record("upload_part", PartNumber=PartNumber)
+            if PartNumber in self.fail_parts:
+                raise RuntimeError(f"part {PartNumber} failed")
+            self.parts[PartNumber] = Body
+            return {"ETag": f"etag-{PartNumber}"}
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self._record("complete_multipart_upload", Parts=MultipartUpload["Parts"])
+        self.objects[Key] = b"".join(
+            self.parts[part["PartNumber"]] for part in MultipartUpload["Parts"]
+        )
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self._record("abort_multipart_upload", UploadId=UploadId)
+
+
+class UploadToMultipleObjectStoresTest(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.work_dir.cleanup)
+
+    def write_file(self, data):
+        path = os.path.join(self.work_dir.name, "recording.flv")
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_multipart_upload_to_every_destination(self):
+        data = os.urandom(23)
+        path = self.write_file(data)
+        first, second = FakeS3Client(), FakeS3Client()
+
+        results = upload_to_multiple_object_stores(
+            [(first, "a"), (second, "b")], path, "Movies/recording.flv", chunk_size=5
+        )
+
+        self.assertEqual(results, [True, True])
+        for client in (first, second):
+            self.assertEqual(client.objects["Movies/recording.flv"], data)
+            (_, complete), = [call for call in client.calls if call[0] == "complete_multipart_upload"]
+            self.assertEqual([part["PartNumber"] for part in complete["Parts"]], [1, 2, 3, 4, 5])
+            self.assertNotIn("abort_multipart_upload", client.call_names())
+
+    def test_failed_part_aborts_only_that_destination(self):
+        data = os.urandom(23)
+        path = self.write_file(data)
+        healthy, failing = FakeS3Client(), FakeS3Client(fail_parts={2})
+
+        results = upload_to_multiple_object_stores(
+            [(healthy, "a"), (failing, "b")], path, "Movies/recording.flv", chunk_size=5
+        )
+
+        self.assertEqual(results, [True, False])
+        self.assertEqual(healthy.objects["Movies/recording.flv"], data)
+        self.assertIn("abort_multipart_upload", failing.call_names())
+        self.assertNotIn("complete_multipart_upload", failing.call_names())
+        self.assertNotIn("abort_multipart_upload", healthy.call_names())
+
+    def test_parts_in_flight_are_bounded(self):
+        path = self.write_file(os.urandom(100))
+        first, second = FakeS3Client(part_delay=0.01), FakeS3Client(part_delay=0.01)
+
+        results = upload_to_multiple_object_stores(
+            [(first, "a"), (second, "b")], path, "Movies/recording.flv", chunk_size=5
+        )
+
+        self.assertEqual(results, [True, True])
+        window = spaces_operations.MAX_POOL_CONNECTIONS // 2
+        for client in (first, second):
+            self.assertGreater(client.max_in_flight, 1)
+            self.assertLessEqual(client.max_in_flight, window)
+
+    def test_empty_file_is_sent_with_single_put(self):
+        path = self.write_file(b"")
+        first, second = FakeS3Client(), FakeS3Client()
+
+        results = upload_to_multiple_object_stores(
+            [(first, "a"), (second, "b")], path, "Movies/recording.flv"
+        )
+
+        self.assertEqual(results, [True, True])
+        for client in (first, second):
+            self.assertEqual(client.call_names(), ["put_object"])
+            self.assertEqual(client.objects["Movies/recording.flv"], b"")
+
+    def test_single_destination_uses_managed_transfer(self):
+        path = self.write_file(os.urandom(23))
+        client = FakeS3Client()
+
+        results = upload_to_multiple_object_stores(
+            [(client, "a")], path, "Movies/recording.flv", chunk_size=5
+        )
+
+        self.assertEqual(results, [True])
+        self.assertEqual(client.call_names(), ["upload_file"])
+
+    def test_part_size_grows_to_stay_within_part_limit(self):
+        data = os.urandom(23)
+        path = self.write_file(data)
+        first, second = FakeS3Client(), FakeS3Client()
+
+        with mock.patch.object(spaces_operations, "MULTIPART_MAX_PARTS", 2):
+            results = upload_to_multiple_object_stores(
+                [(first, "a"), (second, "b")], path, "Movies/recording.flv", chunk_size=5
+            )
+
+        self.assertEqual(results, [True, True])
+        self.assertEqual(sorted(first.parts), [1, 2])
+        self.assertEqual(first.objects["Movies/recording.flv"], data)
+
+
+if __name__ == "__main__":
+    unittest.main()
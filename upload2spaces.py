@@ -1,8 +1,87 @@
 import os
 import logging
+import tempfile
+import uuid
+from datetime import datetime, timezone
 
 from dotenv import load_dotenv
-from dolib.spaces_operations import new_s3_client
+from dolib.packing import (
+    PACK_INDEX_SUFFIX,
+    group_files_for_packing,
+    write_pack,
+    write_pack_index,
+)
+from dolib.spaces_operations import new_s3_client, upload_to_multiple_object_stores
+
+logger = logging.getLogger(__name__)
+
+
+def upload_packed_files(destinations, file_paths, target_folder, target_size):
+    """Bundle small files into tar archives and upload each archive along with its index
+
+    Parameters:
+        destinations: list, (client, bucket) tuples, one per target location
+        file_paths: list, full paths of the files to be packed
+        target_folder: str, folder in the bucket where the archives are uploaded
+        target_size: int, desired size in bytes of each archive
+
+    Returns:
+        Number of files uploaded as part of an archive
+    """
+    packed_count = 0
+    # The random part keeps overlapping runs from overwriting each other's archives
+    run_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:12]
+
+    for number, group in enumerate(group_files_for_packing(file_paths, target_size), 1):
+        archive_name = f"pack-{run_id}-{number:04d}.tar"
+        with tempfile.TemporaryDirectory() as work_dir:
+            archive_path = os.path.join(work_dir, archive_name)
+            index_path = archive_path + PACK_INDEX_SUFFIX
+
+            index = write_pack(group, archive_path)
+            if index is None or not write_pack_index(index, index_path):
+                continue
+
+            logger.info(f"Uploading {archive_name} with {len(group)} files")
+            # The index goes up after the archive so that an index is only ever
+            # visible for a complete archive
+            results = upload_to_multiple_object_stores(
+                destinations,
+                archive_path,
+                target_folder + archive_name,
+                content_type="application/x-tar",
+            )
+            if all(results):
+                results = upload_to_multiple_object_stores(
+                    destinations,
+                    index_path,
+                    target_folder + archive_name + PACK_INDEX_SUFFIX,
+                    content_type="application/json",
+                )
+            if not all(results):
+                logger.error(f"Error uploading {archive_name}, keeping local files")
+                continue
+
+        logger.info(f"Successfully uploaded {archive_name}")
+
+        # Remove local files once every destination has the archive, logging
+        # where each of them went so that it can be fetched later. Files left
+        # out of the index, like symlinks, are kept.
+        for local_path in group:
+            filename = os.path.basename(local_path)
+            if filename not in index:
+                logger.warning(f"{filename} was not packed as a regular file, keeping local file")
+                continue
+            logger.info(f"Packed {filename} into {target_folder + archive_name}")
+            packed_count += 1
+            try:
+                os.remove(local_path)
+            except Exception as e:
+                logger.error(
+                    f"Exception while removing local file {local_path} - {e}"
+                )
+
+    return packed_count
 
 
 def main():
@@ -16,10 +95,12 @@ def main():
     DO_ACCESS_ID = os.getenv("DO_ACCESS_ID")
     DO_SECRET_KEY = os.getenv("DO_SECRET_KEY")
     DO_REGION = os.getenv("DO_REGION")
-    DO_SPACES_URL = f"https://{DO_REGION}.digitaloceanspaces.com"
     DO_BUCKET = os.getenv("DO_BUCKET")
+    DO_DESTINATIONS = os.getenv("DO_DESTINATIONS")
     DO_TARGET_FOLDER = os.getenv("DO_TARGET_FOLDER")
     source_dir = os.getenv("LOCAL_SOURCE_DIR")
+    PACK_FILES_BELOW = os.getenv("PACK_FILES_BELOW")
+    PACK_TARGET_SIZE = os.getenv("PACK_TARGET_SIZE")
 
     log_file = "do_spaces_uploader.log"
     loglevel = "INFO"
@@ -29,8 +110,7 @@ def main():
         filename=log_file,
         level=getattr(logging, loglevel.upper()),
     )
-    logger = logging.getLogger(__name__)
-    
+
     # Also add console handler for immediate feedback
     console_handler = logging.StreamHandler()
     console_handler.setLevel(logging.INFO)
@@ -45,74 +125,132 @@ def main():
         logger.info("Missing trailing slash from DO_TARGET_FOLDER, adding one")
         DO_TARGET_FOLDER = DO_TARGET_FOLDER + "/"
 
+    # DO_DESTINATIONS holds comma separated region:bucket pairs, when it is not
+    # set the single DO_REGION and DO_BUCKET pair is used
+    if DO_DESTINATIONS:
+        try:
+            destinations = [
+                tuple(part.strip() for part in item.split(":", 1))
+                for item in DO_DESTINATIONS.split(",")
+                if item.strip()
+            ]
+            if any(len(item) != 2 or not all(item) for item in destinations):
+                raise ValueError("expected region:bucket pairs with non-empty region and bucket")
+        except Exception as e:
+            logger.error(f"Invalid DO_DESTINATIONS {DO_DESTINATIONS} - {e}")
+            return False
+    else:
+        destinations = [(DO_REGION, DO_BUCKET)]
+
+    # Files smaller than PACK_FILES_BELOW bytes are bundled into archives of
+    # about PACK_TARGET_SIZE bytes. Packing is disabled when it is not set.
     try:
-        # Use helper function to instantiate S3 client with retry logic
-        client = new_s3_client(
-            DO_REGION,
-            DO_SPACES_URL,
-            DO_ACCESS_ID,
-            DO_SECRET_KEY
+        PACK_FILES_BELOW = int(PACK_FILES_BELOW or 0)
+        PACK_TARGET_SIZE = int(PACK_TARGET_SIZE or 64 * 1024 * 1024)
+        if PACK_FILES_BELOW < 0 or PACK_TARGET_SIZE <= 0:
+            raise ValueError("sizes must be positive")
+    except Exception as e:
+        logger.error(
+            f"Invalid PACK_FILES_BELOW {PACK_FILES_BELOW} or PACK_TARGET_SIZE {PACK_TARGET_SIZE} - {e}"
         )
-        
-        if not client:
-            logger.error("Failed to create S3 client")
-            return False
-        
+        return False
+
+    try:
+        # Use helper function to instantiate S3 client with retry logic, one
+        # client per region shared by all the buckets in that region
+        clients = {}
+        for region, _ in destinations:
+            if region in clients:
+                continue
+            clients[region] = new_s3_client(
+                region,
+                f"https://{region}.digitaloceanspaces.com",
+                DO_ACCESS_ID,
+                DO_SECRET_KEY
+            )
+
+            if not clients[region]:
+                logger.error(f"Failed to create S3 client for region {region}")
+                return False
+
     except Exception as e:
         logger.error(f"Error while initiating session - {e}")
         return False
 
     try:
-        # Cache remote file list once - much more efficient than per-file checks
-        remote_files = set()
-        
-        try:
-            paginator = client.get_paginator("list_objects_v2")
-            pages = paginator.paginate(Bucket=DO_BUCKET, Prefix=DO_TARGET_FOLDER)
-            
-            for page in pages:
-                if "Contents" in page:
-                    for obj in page["Contents"]:
-                        # Extract filename from full key path
-                        filename = obj["Key"].replace(DO_TARGET_FOLDER, "")
-                        if filename:  # Ignore folder entries
-                            remote_files.add(filename)
-            
-            logger.info(f"Found {len(remote_files)} existing files in remote bucket")
-        except Exception as e:
-            logger.error(f"Error listing remote files - {e}")
-            return False
+        # Cache remote file list once per destination - much more efficient
+        # than per-file checks
+        remote_files = {}
+
+        for region, bucket in destinations:
+            remote_files[(region, bucket)] = set()
+            try:
+                paginator = clients[region].get_paginator("list_objects_v2")
+                pages = paginator.paginate(Bucket=bucket, Prefix=DO_TARGET_FOLDER)
+
+                for page in pages:
+                    if "Contents" in page:
+                        for obj in page["Contents"]:
+                            # Extract filename from full key path
+                            filename = obj["Key"].replace(DO_TARGET_FOLDER, "")
+                            if filename:  # Ignore folder entries
+                                remote_files[(region, bucket)].add(filename)
+
+                logger.info(
+                    f"Found {len(remote_files[(region, bucket)])} existing files in {bucket} ({region})"
+                )
+            except Exception as e:
+                logger.error(f"Error listing remote files in {bucket} ({region}) - {e}")
+                return False
 
         # Process each file present in source location
         upload_count = 0
         skip_count = 0
+        small_files = []
         
         for filename in os.listdir(source_dir):
             # Consider only allowed file extensions
             if filename.endswith(ALLOWED_EXTENSIONS):
                 local_path = os.path.join(source_dir, filename)
                 
-                # Check if file already exists in remote bucket
-                if filename in remote_files:
+                # Check if file already exists in the remote buckets
+                pending = [
+                    (region, bucket)
+                    for region, bucket in destinations
+                    if filename not in remote_files[(region, bucket)]
+                ]
+                if not pending:
                     logger.info(f"File {filename} already exists, skipping")
                     skip_count += 1
                 else:
                     try:
-                        logger.info(f"Uploading {local_path}")
+                        if PACK_FILES_BELOW and os.path.getsize(local_path) < PACK_FILES_BELOW:
+                            small_files.append(local_path)
+                            continue
+
+                        logger.info(f"Uploading {local_path} to {len(pending)} destination(s)")
                         extension = os.path.splitext(filename)[1].lstrip(".")
                         content_type = FILE_CONTENT_TYPES.get(extension, "binary/octet-stream")
-                        
-                        # Upload file
-                        client.upload_file(
+
+                        # Upload file, reading it once for all the destinations
+                        results = upload_to_multiple_object_stores(
+                            [(clients[region], bucket) for region, bucket in pending],
                             local_path,
-                            DO_BUCKET,
                             DO_TARGET_FOLDER + filename,
-                            ExtraArgs={"ACL": "private", "ContentType": content_type},
+                            content_type=content_type,
                         )
+                        failed = [
+                            bucket for (_, bucket), result in zip(pending, results) if not result
+                        ]
+                        if failed:
+                            logger.error(
+                                f"Error uploading {filename} to {', '.join(failed)}, keeping local file"
+                            )
+                            continue
                         logger.info(f"Successfully uploaded {filename}")
                         upload_count += 1
-                        
-                        # Remove local file after successful upload
+
+                        # Remove local file once every destination has it
                         try:
                             os.remove(local_path)
                             logger.info(f"Removed local file {local_path}")
@@ -122,9 +260,20 @@ def main():
                             )
                     except Exception as e:
                         logger.error(f"Error uploading {filename} - {e}")
-        
+
+        # Packed archives go to every destination, members are not listed
+        # individually in the buckets
+        packed_count = 0
+        if small_files:
+            packed_count = upload_packed_files(
+                [(clients[region], bucket) for region, bucket in destinations],
+                sorted(small_files),
+                DO_TARGET_FOLDER,
+                PACK_TARGET_SIZE,
+            )
+
         logger.info(
-            f"Upload complete: {upload_count} uploaded, {skip_count} skipped"
+            f"Upload complete: {upload_count} uploaded, {packed_count} packed, {skip_count} skipped"
         )
         return True
         